@@ -45,11 +45,13 @@ def compute_novelty(word, freq_db):
     novelty = 1 - (count - min_count) / (max_count - min_count + 1e-6)
     return round(novelty, 3)
 
-def compute_novelty_log(word, freq_db, base=5, unseen_score=1.0, round_digits=3):
+def compute_novelty_log(word, freq_db, base=5, unseen_score=1.0, round_digits=3, bounds=None):
     """
     Novelty in [0,1] using a log scale. 1.0 = totally new, 0.0 = most common.
     - base: log base (default 5)
     - unseen_score: returned for words not in freq_db (default 1.0)
+    - bounds: optional precomputed (min_count, max_count) of freq_db, to avoid
+      rescanning the whole DB when scoring many words
     """
     word = word.upper()
 
@@ -59,9 +61,10 @@ def compute_novelty_log(word, freq_db, base=5, unseen_score=1.0, round_digits=3)
         return float(round(unseen_score, round_digits))
 
     # counts with +1 smoothing to allow log(0) avoidance
-    counts = list(freq_db.values())
-    min_c = min(counts)
-    max_c = max(counts)
+    if bounds is None:
+        counts = list(freq_db.values())
+        bounds = (min(counts), max(counts))
+    min_c, max_c = bounds
 
     # add 1 to everything to avoid log(0)
     def log_x(x):
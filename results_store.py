@@ -0,0 +1,554 @@
+# results_store.py
+"""
+Persistent SQLite store of per-answer and per-puzzle scores.
+
+Every stored score is tagged with what produced it:
+  - algo_version: hash of the wordfreq_algorithms and wikipedia_query modules
+                  plus the installed wordfreq/wordninja versions (stretch)
+  - params:       novelty settings + hash of the novelty/crosswordese code
+  - freq_rev:     hash of the frequency CSV contents (novelty)
+
+Wikipedia pageview counts drift over time and are NOT tracked; re-run with
+a fresh DB file if you need up-to-date view weighting.
+
+`rescore` only recomputes what is stale against the current code/data:
+stretch is recomputed when the algorithm changes (the expensive, possibly
+Wikipedia-backed part, run in parallel), novelty/crosswordese when the
+freq DB or params change, and puzzle aggregates when anything they were
+built from changes. Words whose scoring fails (including failed Wikipedia
+lookups, which are made strict and rate-limited here) are logged and left
+stale for the next run. Ctrl-C cancels queued work and keeps what finished.
+
+Queries only return rows matching the current tags unless --include-stale
+is given.
+
+Usage:
+    python results_store.py rescore [PATH ...] [--algo split_wiki] [--workers 4]
+    python results_store.py hardest --year 2024 [--limit 10] [--by mean_stretch]
+    python results_store.py hardest-answers [--limit 20] [--by stretch]
+"""
+import argparse
+import glob
+import hashlib
+import inspect
+import json
+import os
+import sqlite3
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from datetime import datetime
+from importlib.metadata import PackageNotFoundError, version as package_version
+
+from tqdm import tqdm
+
+import wikipedia_query
+import wordfreq_algorithms
+from analyze_and_visualize import (
+    FREQ_FILE,
+    algo_name as DEFAULT_ALGO,
+    compute_crosswordese,
+    compute_novelty_log,
+    get_across_words,
+    get_down_words,
+    load_freq_db,
+)
+from parse_crossword import grid_from_json_data
+from wordfreq_algorithms import ALGORITHMS
+
+DB_FILE = "crossword_results.sqlite"
+NOVELTY_PARAMS = {"base": 5, "unseen_score": 1.0}
+DEFAULT_WORKERS = 4
+WIKI_MIN_REQUEST_INTERVAL = 0.1  # seconds; caps Wikipedia traffic at ~10 req/s
+WRITE_BATCH_SIZE = 200
+
+PUZZLE_SORT_COLUMNS = ("mean_stretch", "max_stretch", "mean_novelty", "mean_crosswordese")
+ANSWER_SORT_COLUMNS = ("stretch", "novelty", "crosswordese")
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS answer_scores (
+    answer        TEXT NOT NULL,
+    algo_name     TEXT NOT NULL,
+    algo_version  TEXT NOT NULL,
+    params        TEXT NOT NULL,
+    freq_rev      TEXT NOT NULL,
+    stretch       REAL NOT NULL,
+    novelty       REAL NOT NULL,
+    crosswordese  REAL NOT NULL,
+    PRIMARY KEY (answer, algo_name)
+);
+
+CREATE TABLE IF NOT EXISTS puzzles (
+    puzzle_id  TEXT PRIMARY KEY,
+    path       TEXT NOT NULL,
+    publisher  TEXT,
+    date       TEXT,
+    grid_hash  TEXT NOT NULL
+);
+
+CREATE TABLE IF NOT EXISTS puzzle_answers (
+    puzzle_id  TEXT NOT NULL,
+    row        INTEGER NOT NULL,
+    col        INTEGER NOT NULL,
+    direction  TEXT NOT NULL,
+    answer     TEXT NOT NULL,
+    PRIMARY KEY (puzzle_id, row, col, direction)
+);
+
+CREATE TABLE IF NOT EXISTS puzzle_scores (
+    puzzle_id          TEXT NOT NULL,
+    algo_name          TEXT NOT NULL,
+    grid_hash          TEXT NOT NULL,
+    algo_version       TEXT NOT NULL,
+    params             TEXT NOT NULL,
+    freq_rev           TEXT NOT NULL,
+    n_answers          INTEGER NOT NULL,
+    n_scored           INTEGER NOT NULL,
+    mean_stretch       REAL,
+    max_stretch        REAL,
+    mean_novelty       REAL,
+    mean_crosswordese  REAL,
+    PRIMARY KEY (puzzle_id, algo_name)
+);
+
+CREATE INDEX IF NOT EXISTS idx_puzzles_date ON puzzles (date);
+CREATE INDEX IF NOT EXISTS idx_puzzle_answers_answer ON puzzle_answers (answer);
+"""
+
+# A puzzle_scores row is current if it was built from the current grid and
+# tags, and every answer slot had a score when it was aggregated.
+CURRENT_PUZZLE_SQL = """
+    ps.grid_hash = p.grid_hash
+    AND ps.algo_version = ? AND ps.params = ? AND ps.freq_rev = ?
+    AND ps.n_scored = ps.n_answers
+"""
+
+
+# -------------------------------
+# Version tags
+# -------------------------------
+
+def _short_hash(data):
+    if isinstance(data, str):
+        data = data.encode("utf-8")
+    return hashlib.sha256(data).hexdigest()[:16]
+
+
+def _package_version(name):
+    try:
+        return package_version(name)
+    except PackageNotFoundError:
+        return "unknown"
+
+
+def algo_version(name):
+    """
+    Version tag for a rarity algorithm. Hashes the whole of wordfreq_algorithms
+    and wikipedia_query (so edits to shared helpers count) plus the installed
+    wordfreq/wordninja versions. Any edit to those modules marks every
+    algorithm stale, which errs on the side of recomputing.
+    """
+    parts = [
+        name,
+        inspect.getsource(wordfreq_algorithms),
+        inspect.getsource(wikipedia_query),
+        f"wordfreq={_package_version('wordfreq')}",
+        f"wordninja={_package_version('wordninja')}",
+    ]
+    return _short_hash("\n".join(parts))
+
+
+def params_tag(novelty_params=NOVELTY_PARAMS):
+    """Canonical JSON of the novelty settings plus the scoring code they feed."""
+    scoring_src = inspect.getsource(compute_novelty_log) + inspect.getsource(compute_crosswordese)
+    tagged = dict(novelty_params, scoring=_short_hash(scoring_src))
+    return json.dumps(tagged, sort_keys=True)
+
+
+def freq_db_revision(path=FREQ_FILE):
+    """Content hash of the frequency CSV ("none" if it doesn't exist)."""
+    if not os.path.exists(path):
+        return "none"
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1 << 20), b""):
+            h.update(chunk)
+    return h.hexdigest()[:16]
+
+
+def current_tags(name=DEFAULT_ALGO, freq_file=FREQ_FILE, novelty_params=NOVELTY_PARAMS):
+    """(algo_version, params, freq_rev) that fresh scores would be tagged with."""
+    return algo_version(name), params_tag(novelty_params), freq_db_revision(freq_file)
+
+
+# -------------------------------
+# Database helpers
+# -------------------------------
+
+def connect(path=DB_FILE):
+    """Open (and create if needed) the results database."""
+    conn = sqlite3.connect(path)
+    conn.row_factory = sqlite3.Row
+    conn.executescript(SCHEMA)
+    return conn
+
+
+def _normalize_date(raw):
+    """Return an ISO YYYY-MM-DD date from the formats our JSON sources use, else the raw string."""
+    if not raw:
+        return None
+    for fmt in ("%Y-%m-%d", "%m/%d/%Y"):
+        try:
+            return datetime.strptime(raw, fmt).strftime("%Y-%m-%d")
+        except ValueError:
+            pass
+    return raw
+
+
+def find_puzzle_files(paths):
+    """Expand files/directories into a sorted list of absolute puzzle JSON paths."""
+    files = set()
+    for p in paths:
+        if os.path.isdir(p):
+            files.update(glob.glob(os.path.join(p, "**", "*.json"), recursive=True))
+        else:
+            files.add(p)
+    return sorted({os.path.realpath(f) for f in files})
+
+
+def _puzzle_id(data, path):
+    """Stable key: publisher + date when the JSON has both, else the resolved file path."""
+    publisher, date = data.get("publisher"), _normalize_date(data.get("date"))
+    if publisher and date:
+        return f"{publisher}_{date}"
+    return os.path.realpath(path)
+
+
+def _index_puzzle(conn, path):
+    """
+    Record a puzzle's metadata and answer slots.
+    Only rewrites the answer slots if the grid changed since last time.
+    Raises ValueError if the id is already taken by another existing file.
+    Returns the puzzle id.
+    """
+    with open(path, "r", encoding="utf-8") as f:
+        data = json.load(f)
+    grid = grid_from_json_data(data)
+    grid_hash = _short_hash("\n".join("".join(row) for row in grid))
+    puzzle_id = _puzzle_id(data, path)
+
+    row = conn.execute(
+        "SELECT path, grid_hash FROM puzzles WHERE puzzle_id = ?", (puzzle_id,)
+    ).fetchone()
+    if row is not None and row["path"] != path and os.path.exists(row["path"]):
+        raise ValueError(f"puzzle id '{puzzle_id}' is already used by {row['path']}")
+    conn.execute(
+        "INSERT OR REPLACE INTO puzzles (puzzle_id, path, publisher, date, grid_hash) "
+        "VALUES (?, ?, ?, ?, ?)",
+        (puzzle_id, path, data.get("publisher"), _normalize_date(data.get("date")), grid_hash),
+    )
+    if row is None or row["grid_hash"] != grid_hash:
+        conn.execute("DELETE FROM puzzle_answers WHERE puzzle_id = ?", (puzzle_id,))
+        conn.executemany(
+            "INSERT INTO puzzle_answers (puzzle_id, row, col, direction, answer) VALUES (?, ?, ?, ?, ?)",
+            [
+                (puzzle_id, r, c, direction, word.upper())
+                for (r, c), direction, word in get_across_words(grid) + get_down_words(grid)
+            ],
+        )
+    return puzzle_id
+
+
+def _safe_score(rarity, word):
+    """Run a rarity function, returning (stretch, error) instead of raising."""
+    try:
+        return rarity(word), None
+    except Exception as e:
+        return None, e
+
+
+# -------------------------------
+# Re-scoring
+# -------------------------------
+
+def rescore(paths, name=DEFAULT_ALGO, db_path=DB_FILE, freq_file=FREQ_FILE,
+            novelty_params=NOVELTY_PARAMS, workers=DEFAULT_WORKERS):
+    """
+    Bring stored scores for the given puzzles up to date with the current
+    algorithm, params and freq DB, recomputing only what is stale.
+    """
+    rarity = ALGORITHMS[name]
+    version, params, freq_rev = current_tags(name, freq_file, novelty_params)
+
+    conn = connect(db_path)
+
+    # --- Index puzzles (cheap; only re-parses answer slots for changed grids) ---
+    puzzle_ids = set()
+    for path in tqdm(find_puzzle_files(paths), desc="Indexing puzzles"):
+        try:
+            puzzle_ids.add(_index_puzzle(conn, path))
+        except Exception as e:
+            print(f"\nSkipping {path}: {e}")
+    conn.commit()
+
+    # --- Work out which answers are stale ---
+    conn.execute("CREATE TEMP TABLE IF NOT EXISTS wanted (puzzle_id TEXT PRIMARY KEY)")
+    conn.execute("DELETE FROM wanted")
+    conn.executemany("INSERT INTO wanted VALUES (?)", [(p,) for p in puzzle_ids])
+
+    rows = conn.execute(
+        """
+        SELECT DISTINCT pa.answer, s.algo_version, s.params, s.freq_rev, s.stretch
+        FROM puzzle_answers pa
+        JOIN wanted w ON w.puzzle_id = pa.puzzle_id
+        LEFT JOIN answer_scores s ON s.answer = pa.answer AND s.algo_name = ?
+        """,
+        (name,),
+    ).fetchall()
+
+    need_stretch = [r["answer"] for r in rows if r["algo_version"] != version]
+    need_novelty = [
+        (r["answer"], r["stretch"]) for r in rows
+        if r["algo_version"] == version and (r["params"] != params or r["freq_rev"] != freq_rev)
+    ]
+    print(
+        f"{len(rows):,} answers in scope: {len(need_stretch):,} need stretch, "
+        f"{len(need_novelty):,} need novelty only."
+    )
+
+    # --- Score answers, writing in batches so an interrupted run keeps its progress ---
+    freq_db = load_freq_db(freq_file) if (need_stretch or need_novelty) else {}
+    bounds = (min(freq_db.values()), max(freq_db.values())) if freq_db else None
+    batch = []
+    n_written = 0
+    failed = []
+
+    def add(word, stretch):
+        novelty = compute_novelty_log(word, freq_db, bounds=bounds, **novelty_params)
+        crosswordese = compute_crosswordese(stretch, novelty)
+        batch.append((word, name, version, params, freq_rev, stretch, novelty, crosswordese))
+        if len(batch) >= WRITE_BATCH_SIZE:
+            flush()
+
+    def flush():
+        nonlocal n_written
+        conn.executemany(
+            "INSERT OR REPLACE INTO answer_scores "
+            "(answer, algo_name, algo_version, params, freq_rev, stretch, novelty, crosswordese) "
+            "VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+            batch,
+        )
+        conn.commit()
+        n_written += len(batch)
+        batch.clear()
+
+    for word, stretch in need_novelty:
+        add(word, stretch)
+
+    if need_stretch:
+        # Stretch may hit Wikipedia, so run it in parallel; writes stay on this thread.
+        # Failed lookups must raise (not score as 0 views) so they aren't cached.
+        wikipedia_query.RAISE_ON_HTTP_ERROR = True
+        wikipedia_query.MIN_REQUEST_INTERVAL = max(
+            wikipedia_query.MIN_REQUEST_INTERVAL, WIKI_MIN_REQUEST_INTERVAL
+        )
+        pool = ThreadPoolExecutor(max_workers=workers)
+        futures = {pool.submit(_safe_score, rarity, word): word for word in need_stretch}
+
+        def collect(future):
+            word = futures.pop(future)
+            stretch, error = future.result()
+            if error is not None:
+                print(f"\nError scoring '{word}': {error}")
+                failed.append(word)
+            else:
+                add(word, stretch)
+
+        try:
+            for future in tqdm(as_completed(list(futures)), total=len(futures),
+                               desc=f"Scoring stretch ({name})"):
+                collect(future)
+        except BaseException:
+            # Don't run (and then discard) the queued words; keep what already finished
+            pool.shutdown(wait=False, cancel_futures=True)
+            for future in list(futures):
+                if future.done() and not future.cancelled():
+                    collect(future)
+            flush()
+            conn.close()
+            raise
+        pool.shutdown()
+    flush()
+
+    if failed:
+        print(f"⚠️ {len(failed):,} answers failed to score and were left stale for the next run.")
+
+    # --- Rebuild aggregates for puzzles whose inputs changed or were incomplete ---
+    stale = conn.execute(
+        f"""
+        SELECT w.puzzle_id FROM wanted w
+        JOIN puzzles p ON p.puzzle_id = w.puzzle_id
+        LEFT JOIN puzzle_scores ps ON ps.puzzle_id = w.puzzle_id AND ps.algo_name = ?
+        WHERE ps.puzzle_id IS NULL OR NOT ({CURRENT_PUZZLE_SQL})
+        """,
+        (name, version, params, freq_rev),
+    ).fetchall()
+    conn.executemany(
+        """
+        INSERT OR REPLACE INTO puzzle_scores
+        SELECT p.puzzle_id, ?, p.grid_hash, ?, ?, ?,
+               COUNT(pa.answer), COUNT(s.answer),
+               AVG(s.stretch), MAX(s.stretch), AVG(s.novelty), AVG(s.crosswordese)
+        FROM puzzles p
+        LEFT JOIN puzzle_answers pa ON pa.puzzle_id = p.puzzle_id
+        LEFT JOIN answer_scores s ON s.answer = pa.answer AND s.algo_name = ?
+            AND s.algo_version = ? AND s.params = ? AND s.freq_rev = ?
+        WHERE p.puzzle_id = ?
+        GROUP BY p.puzzle_id
+        """,
+        [
+            (name, version, params, freq_rev, name, version, params, freq_rev, r["puzzle_id"])
+            for r in stale
+        ],
+    )
+    conn.commit()
+
+    n_incomplete = conn.execute(
+        "SELECT COUNT(*) FROM puzzle_scores ps JOIN wanted w ON w.puzzle_id = ps.puzzle_id "
+        "WHERE ps.algo_name = ? AND ps.n_scored < ps.n_answers",
+        (name,),
+    ).fetchone()[0]
+    conn.close()
+
+    print(f"✅ Re-scored {n_written:,} answers and {len(stale):,} of {len(puzzle_ids):,} puzzles.")
+    if n_incomplete:
+        print(f"⚠️ {n_incomplete:,} puzzles still have unscored answers and will be retried next run.")
+
+
+# -------------------------------
+# Queries
+# -------------------------------
+
+def hardest_puzzles(year=None, name=DEFAULT_ALGO, by="mean_stretch", limit=10,
+                    db_path=DB_FILE, include_stale=False, freq_file=FREQ_FILE):
+    """
+    Top puzzles by a stored aggregate, optionally restricted to one year.
+    Stale or incomplete rows are excluded (and counted) unless include_stale.
+    Returns (rows, n_excluded).
+    """
+    if by not in PUZZLE_SORT_COLUMNS:
+        raise ValueError(f"'by' must be one of {PUZZLE_SORT_COLUMNS}")
+    where = " WHERE ps.algo_name = ?"
+    args = [name]
+    if year is not None:
+        where += " AND p.date >= ? AND p.date < ?"
+        args += [f"{year}-01-01", f"{int(year) + 1}-01-01"]
+    tags = list(current_tags(name, freq_file))
+    base = " FROM puzzle_scores ps JOIN puzzles p ON p.puzzle_id = ps.puzzle_id" + where
+
+    conn = connect(db_path)
+    n_excluded = 0
+    if not include_stale:
+        n_excluded = conn.execute(
+            f"SELECT COUNT(*) {base} AND NOT ({CURRENT_PUZZLE_SQL})", args + tags
+        ).fetchone()[0]
+        base += f" AND {CURRENT_PUZZLE_SQL}"
+        args += tags
+    rows = [
+        dict(r) for r in conn.execute(
+            f"SELECT p.puzzle_id, p.publisher, p.date, ps.n_answers, ps.{by} AS score {base} "
+            f"AND ps.{by} IS NOT NULL ORDER BY ps.{by} DESC LIMIT ?",
+            args + [limit],
+        )
+    ]
+    conn.close()
+    return rows, n_excluded
+
+
+def hardest_answers(name=DEFAULT_ALGO, by="stretch", limit=20, db_path=DB_FILE,
+                    include_stale=False, freq_file=FREQ_FILE):
+    """
+    Top stored answers by stretch, novelty or crosswordese.
+    Stale rows are excluded (and counted) unless include_stale.
+    Returns (rows, n_excluded).
+    """
+    if by not in ANSWER_SORT_COLUMNS:
+        raise ValueError(f"'by' must be one of {ANSWER_SORT_COLUMNS}")
+    base = " FROM answer_scores WHERE algo_name = ?"
+    args = [name]
+    current = " algo_version = ? AND params = ? AND freq_rev = ?"
+    tags = list(current_tags(name, freq_file))
+
+    conn = connect(db_path)
+    n_excluded = 0
+    if not include_stale:
+        n_excluded = conn.execute(
+            f"SELECT COUNT(*) {base} AND NOT ({current})", args + tags
+        ).fetchone()[0]
+        base += f" AND {current}"
+        args += tags
+    rows = [
+        dict(r) for r in conn.execute(
+            f"SELECT answer, {by} AS score {base} ORDER BY {by} DESC LIMIT ?",
+            args + [limit],
+        )
+    ]
+    conn.close()
+    return rows, n_excluded
+
+
+# -------------------------------
+# CLI
+# -------------------------------
+
+def main():
+    common = argparse.ArgumentParser(add_help=False)
+    common.add_argument("--db", default=DB_FILE, help="SQLite results file")
+    common.add_argument("--algo", default=DEFAULT_ALGO, choices=sorted(ALGORITHMS))
+    common.add_argument("--freq-file", default=FREQ_FILE)
+
+    stale_opt = argparse.ArgumentParser(add_help=False)
+    stale_opt.add_argument("--include-stale", action="store_true",
+                           help="also show rows scored by an older algorithm/params/freq DB")
+
+    parser = argparse.ArgumentParser(description="Persistent crossword results store.")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    p_rescore = sub.add_parser("rescore", parents=[common], help="recompute stale scores")
+    p_rescore.add_argument("paths", nargs="*", default=["."], help="puzzle JSON files or folders")
+    p_rescore.add_argument("--workers", type=int, default=DEFAULT_WORKERS)
+
+    p_hardest = sub.add_parser("hardest", parents=[common, stale_opt], help="hardest stored puzzles")
+    p_hardest.add_argument("--year", type=int)
+    p_hardest.add_argument("--by", default="mean_stretch", choices=PUZZLE_SORT_COLUMNS)
+    p_hardest.add_argument("--limit", type=int, default=10)
+
+    p_answers = sub.add_parser("hardest-answers", parents=[common, stale_opt],
+                               help="hardest stored answers")
+    p_answers.add_argument("--by", default="stretch", choices=ANSWER_SORT_COLUMNS)
+    p_answers.add_argument("--limit", type=int, default=20)
+
+    args = parser.parse_args()
+
+    if args.command == "rescore":
+        rescore(args.paths, name=args.algo, db_path=args.db,
+                freq_file=args.freq_file, workers=args.workers)
+        return
+
+    if args.command == "hardest":
+        rows, n_excluded = hardest_puzzles(args.year, name=args.algo, by=args.by, limit=args.limit,
+                                           db_path=args.db, include_stale=args.include_stale,
+                                           freq_file=args.freq_file)
+        for r in rows:
+            print(f"  {r['date'] or '?'}  {r['puzzle_id']}: {r['score']:.3f} ({r['n_answers']} answers)")
+    else:
+        rows, n_excluded = hardest_answers(name=args.algo, by=args.by, limit=args.limit,
+                                           db_path=args.db, include_stale=args.include_stale,
+                                           freq_file=args.freq_file)
+        for r in rows:
+            print(f"  {r['answer']}: {r['score']}")
+
+    if n_excluded:
+        print(f"\n({n_excluded:,} stale rows excluded; run `rescore` or pass --include-stale)")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,10 +1,31 @@
 import requests
 import json
+import threading
+import time
 from datetime import datetime, timedelta
 
 HEADERS = {
     "User-Agent": "CrosswordAnalysisTool/1.0 (https://github.com/21nobrac/CrosswordAnalysisTool; carbonamarshall@gmail.com)"
 }
+
+# Batch callers (e.g. results_store) turn these on so that a failed lookup is
+# an error rather than a silent 0 views, and so parallel workers share a rate limit.
+RAISE_ON_HTTP_ERROR = False
+MIN_REQUEST_INTERVAL = 0.0  # seconds between requests, across all threads
+
+_throttle_lock = threading.Lock()
+_last_request = 0.0
+
+def _throttle():
+    """Sleep so that requests are at least MIN_REQUEST_INTERVAL apart."""
+    global _last_request
+    if MIN_REQUEST_INTERVAL <= 0:
+        return
+    with _throttle_lock:
+        wait = _last_request + MIN_REQUEST_INTERVAL - time.monotonic()
+        if wait > 0:
+            time.sleep(wait)
+        _last_request = time.monotonic()
     
 
 def get_json(title: str):
@@ -14,6 +35,7 @@ def get_json(title: str):
         "titles": title,
         "format": "json"
     }
+    _throttle()
     response = requests.get(url, params=params, headers=HEADERS)
     response.raise_for_status()
     return response.json()
@@ -29,6 +51,7 @@ def get_canonical_title(title: str, lang: str = "en") -> str:
         "titles": title,
         "format": "json"
     }
+    _throttle()
     r = requests.get(url, params=params, headers=HEADERS)
     r.raise_for_status()
     data = r.json()
@@ -54,8 +77,12 @@ def get_views(title: str, days: int = 30, lang: str = "en") -> int:
         f"{start_date.strftime('%Y%m%d')}/{end_date.strftime('%Y%m%d')}"
     )
 
+    _throttle()
     r = requests.get(url, headers=HEADERS)
     if r.status_code != 200:
+        if RAISE_ON_HTTP_ERROR:
+            r.raise_for_status()
+            raise RuntimeError(f"Unexpected HTTP {r.status_code} fetching views for '{title}'")
         print(f"Error fetching views for '{title}': HTTP {r.status_code}")
         return 0
 